@@ -0,0 +1,185 @@
+/*
+ * Optional native kernel for the pairwise Hamming search in comparator.py.
+ *
+ * Build (any plain C compiler, no special flags needed — the SIMD paths
+ * use per-function target attributes and are selected at runtime):
+ *
+ *     cc -O3 -shared -fPIC -o _hamming.so _hamming.c
+ *
+ * Loaded via ctypes by hamming_native.py; the backend runs fine without it.
+ */
+#include <stdint.h>
+#include <stddef.h>
+
+/*
+ * Emit a surviving pair. The caller provides output buffers of capacity
+ * `cap`; pairs beyond the capacity are counted but not written, so the
+ * caller can retry with a larger buffer.
+ */
+#define EMIT(ii, jj, dd)                     \
+    do {                                     \
+        if (count < cap) {                   \
+            out_i[count] = (int32_t)(ii);    \
+            out_j[count] = (int32_t)(jj);    \
+            out_d[count] = (uint8_t)(dd);    \
+        }                                    \
+        count++;                             \
+    } while (0)
+
+static int64_t
+pairs_scalar(const uint64_t *hashes, int64_t n, int64_t thr,
+             int32_t *out_i, int32_t *out_j, uint8_t *out_d, int64_t cap)
+{
+    int64_t count = 0;
+    for (int64_t i = 0; i < n; i++) {
+        uint64_t h = hashes[i];
+        for (int64_t j = i + 1; j < n; j++) {
+            int d = __builtin_popcountll(h ^ hashes[j]);
+            if (d <= thr)
+                EMIT(i, j, d);
+        }
+    }
+    return count;
+}
+
+#if defined(__x86_64__)
+#include <immintrin.h>
+
+/*
+ * AVX2 path: 4 hashes per iteration. Popcount via the Mula vpshufb
+ * nibble lookup, reduced per 64-bit lane with vpsadbw.
+ */
+__attribute__((target("avx2")))
+static int64_t
+pairs_avx2(const uint64_t *hashes, int64_t n, int64_t thr,
+           int32_t *out_i, int32_t *out_j, uint8_t *out_d, int64_t cap)
+{
+    const __m256i lut = _mm256_setr_epi8(
+        0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4,
+        0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4);
+    const __m256i low_mask = _mm256_set1_epi8(0x0f);
+
+    int64_t count = 0;
+    for (int64_t i = 0; i < n; i++) {
+        const __m256i bcast = _mm256_set1_epi64x((long long)hashes[i]);
+        int64_t j = i + 1;
+        for (; j + 4 <= n; j += 4) {
+            __m256i v = _mm256_loadu_si256((const __m256i *)(hashes + j));
+            __m256i x = _mm256_xor_si256(v, bcast);
+            __m256i lo = _mm256_and_si256(x, low_mask);
+            __m256i hi = _mm256_and_si256(_mm256_srli_epi32(x, 4), low_mask);
+            __m256i cnt = _mm256_add_epi8(_mm256_shuffle_epi8(lut, lo),
+                                          _mm256_shuffle_epi8(lut, hi));
+            __m256i pc = _mm256_sad_epu8(cnt, _mm256_setzero_si256());
+
+            uint64_t pcs[4];
+            _mm256_storeu_si256((__m256i *)pcs, pc);
+            for (int k = 0; k < 4; k++) {
+                if ((int64_t)pcs[k] <= thr)
+                    EMIT(i, j + k, pcs[k]);
+            }
+        }
+        for (; j < n; j++) {
+            int d = __builtin_popcountll(hashes[i] ^ hashes[j]);
+            if (d <= thr)
+                EMIT(i, j, d);
+        }
+    }
+    return count;
+}
+
+/*
+ * AVX-512 path: 8 hashes per iteration with the dedicated VPOPCNTQ
+ * instruction (Ice Lake+); survivors fall out of a single compare mask.
+ */
+__attribute__((target("avx512f,avx512vpopcntdq")))
+static int64_t
+pairs_avx512(const uint64_t *hashes, int64_t n, int64_t thr,
+             int32_t *out_i, int32_t *out_j, uint8_t *out_d, int64_t cap)
+{
+    const __m512i thr_vec = _mm512_set1_epi64(thr);
+
+    int64_t count = 0;
+    for (int64_t i = 0; i < n; i++) {
+        const __m512i bcast = _mm512_set1_epi64((long long)hashes[i]);
+        int64_t j = i + 1;
+        for (; j + 8 <= n; j += 8) {
+            __m512i x = _mm512_xor_si512(bcast,
+                                         _mm512_loadu_si512(hashes + j));
+            __m512i pc = _mm512_popcnt_epi64(x);
+            __mmask8 m = _mm512_cmple_epu64_mask(pc, thr_vec);
+            if (m) {
+                uint64_t pcs[8];
+                _mm512_storeu_si512(pcs, pc);
+                while (m) {
+                    int k = __builtin_ctz(m);
+                    m &= m - 1;
+                    EMIT(i, j + k, pcs[k]);
+                }
+            }
+        }
+        for (; j < n; j++) {
+            int d = __builtin_popcountll(hashes[i] ^ hashes[j]);
+            if (d <= thr)
+                EMIT(i, j, d);
+        }
+    }
+    return count;
+}
+#endif /* __x86_64__ */
+
+#if defined(__aarch64__)
+#include <arm_neon.h>
+
+/*
+ * NEON path (baseline on AArch64, no runtime check needed): 2 hashes per
+ * iteration, counted with vcntq_u8 and pairwise-widened to per-hash sums.
+ */
+static int64_t
+pairs_neon(const uint64_t *hashes, int64_t n, int64_t thr,
+           int32_t *out_i, int32_t *out_j, uint8_t *out_d, int64_t cap)
+{
+    int64_t count = 0;
+    for (int64_t i = 0; i < n; i++) {
+        const uint8x16_t bcast = vreinterpretq_u8_u64(vdupq_n_u64(hashes[i]));
+        int64_t j = i + 1;
+        for (; j + 2 <= n; j += 2) {
+            uint8x16_t v = vld1q_u8((const uint8_t *)(hashes + j));
+            uint8x16_t x = veorq_u8(v, bcast);
+            uint64x2_t pc = vpaddlq_u32(vpaddlq_u16(vpaddlq_u8(vcntq_u8(x))));
+            uint64_t d0 = vgetq_lane_u64(pc, 0);
+            uint64_t d1 = vgetq_lane_u64(pc, 1);
+            if ((int64_t)d0 <= thr)
+                EMIT(i, j, d0);
+            if ((int64_t)d1 <= thr)
+                EMIT(i, j + 1, d1);
+        }
+        for (; j < n; j++) {
+            int d = __builtin_popcountll(hashes[i] ^ hashes[j]);
+            if (d <= thr)
+                EMIT(i, j, d);
+        }
+    }
+    return count;
+}
+#endif /* __aarch64__ */
+
+/*
+ * Find all pairs (i, j) with i < j and popcount(hashes[i] ^ hashes[j]) <= thr.
+ * Returns the total number of surviving pairs; at most `cap` of them are
+ * written to the output buffers.
+ */
+int64_t
+hamming_pairs(const uint64_t *hashes, int64_t n, int64_t thr,
+              int32_t *out_i, int32_t *out_j, uint8_t *out_d, int64_t cap)
+{
+#if defined(__x86_64__)
+    if (__builtin_cpu_supports("avx512vpopcntdq"))
+        return pairs_avx512(hashes, n, thr, out_i, out_j, out_d, cap);
+    if (__builtin_cpu_supports("avx2"))
+        return pairs_avx2(hashes, n, thr, out_i, out_j, out_d, cap);
+#elif defined(__aarch64__)
+    return pairs_neon(hashes, n, thr, out_i, out_j, out_d, cap);
+#endif
+    return pairs_scalar(hashes, n, thr, out_i, out_j, out_d, cap);
+}
@@ -1,16 +1,114 @@
 """
 Image comparison logic using perceptual hashing
 """
+import functools
 import logging
-from typing import List, Dict, Tuple
-from datetime import datetime
-import imagehash
+from typing import List, Tuple
+import numpy as np
+import database
 from database import db
 from models import FileInfo, DuplicatePair
+from comparator_index import BKTree
+import hamming_native
+
+# Numba is an optional accelerator: when present, the pairwise kernel
+# runs as a parallel JIT-compiled loop across all CPU cores
+try:
+    import numba
+except ImportError:
+    numba = None
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=200_000)
+def _file_info_memo(path, filename, size_bytes, width, height,
+                    created_at, modified_at, file_type, hash_hex) -> FileInfo:
+    """
+    Memoized FileInfo construction keyed on the immutable row fields
+
+    Dashboards re-request /api/duplicates at varying thresholds; the same
+    rows keep resurfacing, so the Pydantic objects (and the size_mb
+    division/round) are built once per file instead of once per call.
+    """
+    return FileInfo(
+        path=path,
+        filename=filename,
+        size_mb=round(size_bytes / 1048576.0, 2),
+        width=width,
+        height=height,
+        created_at=created_at,
+        modified_at=modified_at,
+        file_type=file_type,
+        hash=hash_hex
+    )
+
+
+# Any write to the files table invalidates the memoized FileInfo objects
+database.register_write_hook(_file_info_memo.cache_clear)
+
+# Tile size for the blocked pairwise comparison (keeps each distance
+# matrix block small enough to stay cache-resident)
+COMPARE_TILE_SIZE = 1024
+
+# Above this many files the O(N^2) tiled scan is replaced by a BK-tree,
+# which only visits candidates within the threshold radius
+BKTREE_MIN_FILES = 10000
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _find_pairs_nb(hashes, threshold):  # pragma: no cover - needs numba
+        """Parallel pairwise Hamming search over packed uint64 hashes"""
+        n = hashes.shape[0]
+
+        # First pass: count matches per row so the output arrays can be
+        # preallocated instead of dynamically resized
+        counts = np.zeros(n, dtype=np.int64)
+        for i in numba.prange(n):
+            hit = 0
+            h = hashes[i]
+            for j in range(i + 1, n):
+                x = h ^ hashes[j]
+                # SWAR popcount; LLVM lowers this to ctpop/POPCNT
+                x = x - ((x >> 1) & np.uint64(0x5555555555555555))
+                x = (x & np.uint64(0x3333333333333333)) + ((x >> 2) & np.uint64(0x3333333333333333))
+                x = (x + (x >> 4)) & np.uint64(0x0F0F0F0F0F0F0F0F)
+                d = (x * np.uint64(0x0101010101010101)) >> 56
+                if d <= threshold:
+                    hit += 1
+            counts[i] = hit
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        for i in range(n):
+            offsets[i + 1] = offsets[i] + counts[i]
+        total = offsets[n]
+
+        i_out = np.empty(total, dtype=np.int64)
+        j_out = np.empty(total, dtype=np.int64)
+        d_out = np.empty(total, dtype=np.int64)
+
+        # Second pass: write each row's matches at its prefix-sum offset
+        for i in numba.prange(n):
+            pos = offsets[i]
+            h = hashes[i]
+            for j in range(i + 1, n):
+                x = h ^ hashes[j]
+                x = x - ((x >> 1) & np.uint64(0x5555555555555555))
+                x = (x & np.uint64(0x3333333333333333)) + ((x >> 2) & np.uint64(0x3333333333333333))
+                x = (x + (x >> 4)) & np.uint64(0x0F0F0F0F0F0F0F0F)
+                d = (x * np.uint64(0x0101010101010101)) >> 56
+                if d <= threshold:
+                    i_out[pos] = i
+                    j_out[pos] = j
+                    d_out[pos] = d
+                    pos += 1
+
+        return i_out, j_out, d_out
+else:
+    _find_pairs_nb = None
+
+
 class ImageComparator:
     """Compare images using perceptual hashing and Hamming distance"""
 
@@ -21,10 +119,10 @@ class ImageComparator:
         Returns the number of differing bits
         """
         try:
-            h1 = imagehash.hex_to_hash(hash1)
-            h2 = imagehash.hex_to_hash(hash2)
-            return h1 - h2  # imagehash overloads - operator for Hamming distance
-        except Exception as e:
+            # XOR the raw 64-bit values and count differing bits; CPython
+            # lowers int.bit_count() to a single POPCNT instruction
+            return (int(hash1, 16) ^ int(hash2, 16)).bit_count()
+        except (ValueError, TypeError) as e:
             logger.error(f"Error calculating Hamming distance: {e}")
             return 999  # Return high value on error
 
@@ -34,27 +132,129 @@ class ImageComparator:
         Convert Hamming distance to similarity percentage
         hash_size=8 means 64 bits total (8x8)
         """
-        max_distance = hash_size * hash_size
-        similarity = (1 - (hamming_distance / max_distance)) * 100
-        return round(similarity, 2)
+        # 100/64 = 1.5625 is exact in floating point, so one multiply
+        # replaces the divide-and-subtract dance
+        return round(100.0 - hamming_distance * (100.0 / (hash_size * hash_size)), 2)
 
     @staticmethod
-    def db_row_to_file_info(row: Dict) -> FileInfo:
-        """Convert database row to FileInfo model"""
-        return FileInfo(
-            path=row['path'],
-            filename=row['filename'],
-            size_mb=round(row['size_bytes'] / (1024 * 1024), 2),
-            width=row.get('width'),
-            height=row.get('height'),
-            created_at=datetime.fromisoformat(row['created_at']) if isinstance(row['created_at'], str) else row['created_at'],
-            modified_at=datetime.fromisoformat(row['modified_at']) if isinstance(row['modified_at'], str) else row['modified_at'],
-            file_type=row['file_type'],
-            hash=row.get('hash')
+    def db_row_to_file_info(row) -> FileInfo:
+        """Convert database row to FileInfo model (memoized per file)"""
+        return _file_info_memo(
+            row['path'],
+            row['filename'],
+            row['size_bytes'],
+            row['width'],
+            row['height'],
+            row['created_at'],
+            row['modified_at'],
+            row['file_type'],
+            row['hash'].hex() if isinstance(row['hash'], bytes) else row['hash']
         )
 
     @staticmethod
-    async def find_duplicates(similarity_threshold: int = 5, file_type: str = 'both') -> List[DuplicatePair]:
+    def _pairwise_hamming(hashes: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute all pairs (i, j) with i < j whose Hamming distance is <= threshold
+
+        The comparison is done in tiles of COMPARE_TILE_SIZE x COMPARE_TILE_SIZE:
+        each tile is a broadcast XOR of two hash slices followed by a vectorized
+        popcount, so the O(N^2) work runs in C instead of the interpreter.
+
+        Args:
+            hashes: uint64 array of 64-bit perceptual hashes, shape (N,)
+            threshold: Maximum Hamming distance
+
+        Returns:
+            Tuple of (i_indices, j_indices, distances) arrays
+        """
+        # Kernel dispatch: native C extension > Numba JIT > NumPy tiles
+        if hamming_native.is_available():
+            return hamming_native.find_pairs(hashes, threshold)
+        if _find_pairs_nb is not None:
+            return _find_pairs_nb(np.ascontiguousarray(hashes), threshold)
+
+        n = len(hashes)
+        tile = COMPARE_TILE_SIZE
+        i_out, j_out, d_out = [], [], []
+
+        for i0 in range(0, n, tile):
+            hi = hashes[i0:i0 + tile]
+            for j0 in range(i0, n, tile):
+                hj = hashes[j0:j0 + tile]
+                dist = np.bitwise_count(hi[:, None] ^ hj[None, :])
+                mask = dist <= threshold
+                if i0 == j0:
+                    # Only keep the upper triangle so each pair is visited once
+                    mask &= np.triu(np.ones(mask.shape, dtype=bool), k=1)
+                ii, jj = np.nonzero(mask)
+                if len(ii):
+                    i_out.append(ii + i0)
+                    j_out.append(jj + j0)
+                    d_out.append(dist[mask])
+
+        if not i_out:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, empty
+        return np.concatenate(i_out), np.concatenate(j_out), np.concatenate(d_out)
+
+    @staticmethod
+    def _identical_pairs(hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        threshold == 0 fast path: emit all pairs within runs of equal hashes
+
+        Relies on the rows arriving sorted by hash (get_files_with_hashes
+        does ORDER BY hash), so identical hashes are adjacent and a single
+        O(N) walk replaces the pairwise comparison entirely.
+        """
+        i_out, j_out = [], []
+        n = len(hashes)
+        start = 0
+        while start < n:
+            end = start + 1
+            while end < n and hashes[end] == hashes[start]:
+                end += 1
+            for a in range(start, end):
+                for b in range(a + 1, end):
+                    i_out.append(a)
+                    j_out.append(b)
+            start = end
+        return (
+            np.array(i_out, dtype=np.int64),
+            np.array(j_out, dtype=np.int64),
+            np.zeros(len(i_out), dtype=np.int64)
+        )
+
+    @staticmethod
+    def _pairwise_hamming_bktree(hashes: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        BK-tree variant of _pairwise_hamming for large collections
+
+        Builds the index once, then queries each hash within the threshold
+        radius — roughly O(N log N) for small thresholds instead of O(N^2).
+        Only pairs with j > i are kept so each pair is emitted once.
+        """
+        tree = BKTree()
+        values = [int(h) for h in hashes]
+        for idx, value in enumerate(values):
+            tree.add(value, idx)
+
+        i_out, j_out, d_out = [], [], []
+        for i, value in enumerate(values):
+            for j, distance in tree.query(value, threshold):
+                if j > i:
+                    i_out.append(i)
+                    j_out.append(j)
+                    d_out.append(distance)
+
+        return (
+            np.array(i_out, dtype=np.int64),
+            np.array(j_out, dtype=np.int64),
+            np.array(d_out, dtype=np.int64)
+        )
+
+    @staticmethod
+    async def find_duplicates(similarity_threshold: int = 5, file_type: str = 'both',
+                              limit: int = None) -> Tuple[List[DuplicatePair], float]:
         """
         Find all duplicate/similar pairs based on perceptual hash similarity
 
@@ -65,65 +265,69 @@ class ImageComparator:
                                 10 = somewhat similar
                                 15 = loosely similar
             file_type: Type of files to compare ('image', 'video', or 'both')
+            limit: If set, return only the top `limit` most similar pairs
 
         Returns:
-            List of DuplicatePair objects
+            Tuple of (DuplicatePair list, total potential savings in MB if
+            the larger file of every matching pair were deleted)
         """
         logger.info(f"Finding duplicates with threshold={similarity_threshold}, file_type={file_type}")
 
-        # Get all files with hashes, filtered by type
-        files = await db.get_files_with_hashes(file_type=file_type)
-        logger.info(f"Comparing {len(files)} files")
-
-        pairs = []
-        compared = set()  # Track compared pairs to avoid duplicates
-
-        # Compare all files pairwise
-        for i in range(len(files)):
-            for j in range(i + 1, len(files)):
-                file1 = files[i]
-                file2 = files[j]
+        # Fetch only the columns the kernel needs (SoA); full rows are
+        # hydrated later, and only for pairs that survive the threshold
+        ids, sizes, packed_hashes = await db.get_hash_soa(file_type=file_type)
+        logger.info(f"Comparing {len(ids)} files")
 
-                # Skip if already compared
-                pair_key = tuple(sorted([file1['path'], file2['path']]))
-                if pair_key in compared:
-                    continue
-                compared.add(pair_key)
+        # Hashes arrive as one packed buffer of 8-byte big-endian values;
+        # view them as a contiguous uint64 array without any parsing
+        hashes = np.frombuffer(packed_hashes, dtype='>u8').astype(np.uint64)
 
-                # Skip if either file doesn't have a hash
-                if not file1.get('hash') or not file2.get('hash'):
-                    continue
+        # Vectorized pairwise comparison; large collections go through the
+        # BK-tree so the work scales with matches instead of N^2, and
+        # identical-only searches reduce to a linear scan of the sorted rows
+        if similarity_threshold == 0:
+            i_idx, j_idx, distances = ImageComparator._identical_pairs(hashes)
+        elif len(hashes) >= BKTREE_MIN_FILES:
+            i_idx, j_idx, distances = ImageComparator._pairwise_hamming_bktree(
+                hashes, similarity_threshold
+            )
+        else:
+            i_idx, j_idx, distances = ImageComparator._pairwise_hamming(
+                hashes, similarity_threshold
+            )
 
-                # Calculate similarity
-                distance = ImageComparator.hamming_distance(file1['hash'], file2['hash'])
+        # Potential savings: one fused reduction over all surviving pairs
+        # (not just the top `limit`), taking the larger file of each pair
+        sizes_mb = np.asarray(sizes, dtype=np.float64) / 1048576.0
+        total_savings_mb = round(
+            float(np.maximum(sizes_mb[i_idx], sizes_mb[j_idx]).sum()), 2
+        )
 
-                # If similar enough, add to pairs
-                if distance <= similarity_threshold:
-                    similarity_pct = ImageComparator.calculate_similarity_percentage(distance)
+        # Sort by similarity (most similar first). With a limit, select the
+        # top K via argpartition — O(M) instead of a full O(M log M) sort
+        if limit is not None and limit < len(distances):
+            top = np.argpartition(distances, limit)[:limit]
+            order = top[np.argsort(distances[top], kind='stable')]
+        else:
+            order = np.argsort(distances, kind='stable')
 
-                    pair = DuplicatePair(
-                        file1=ImageComparator.db_row_to_file_info(file1),
-                        file2=ImageComparator.db_row_to_file_info(file2),
-                        similarity_score=distance,
-                        similarity_percentage=similarity_pct
-                    )
-                    pairs.append(pair)
+        # Hydrate full rows for the returned pairs only
+        survivor_ids = {ids[i_idx[k]] for k in order} | {ids[j_idx[k]] for k in order}
+        rows = await db.get_files_by_ids(list(survivor_ids))
 
-        # Sort by similarity (most similar first)
-        pairs.sort(key=lambda p: p.similarity_score)
+        # Similarity percentages for all returned pairs in one NumPy op
+        sim_pcts = np.round(100.0 - distances[order] * (100.0 / 64.0), 2)
 
-        logger.info(f"Found {len(pairs)} duplicate/similar pairs")
-        return pairs
+        # Build DuplicatePair objects only for the surviving pairs
+        pairs = []
+        for n, k in enumerate(order):
+            pairs.append(DuplicatePair(
+                file1=ImageComparator.db_row_to_file_info(rows[ids[i_idx[k]]]),
+                file2=ImageComparator.db_row_to_file_info(rows[ids[j_idx[k]]]),
+                similarity_score=int(distances[k]),
+                similarity_percentage=float(sim_pcts[n])
+            ))
 
-    @staticmethod
-    def calculate_potential_savings(pairs: List[DuplicatePair]) -> float:
-        """
-        Calculate total potential disk space savings if one file from each pair is deleted
-        Takes the larger file from each pair
-        """
-        total_mb = 0.0
-        for pair in pairs:
-            # Take the larger file as potential savings
-            larger_size = max(pair.file1.size_mb, pair.file2.size_mb)
-            total_mb += larger_size
-        return round(total_mb, 2)
+        logger.info(f"Found {len(pairs)} duplicate/similar pairs "
+                    f"({total_savings_mb} MB potential savings)")
+        return pairs, total_savings_mb
@@ -0,0 +1,68 @@
+"""
+Hamming-space index for sub-quadratic duplicate candidate search
+"""
+import logging
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit perceptual hashes keyed on Hamming distance
+
+    Lookups prune subtrees via the triangle inequality: a child stored at
+    distance d from its parent can only contain matches for a query at
+    distance q if |q - d| <= radius. For the small radii used by the
+    comparator (threshold <= 15 out of 64 bits) this visits a small
+    fraction of the tree instead of every entry.
+    """
+
+    __slots__ = ('_hashes', '_indices', '_children')
+
+    def __init__(self):
+        # Parallel arrays: hash value, payload index and per-node child
+        # table mapping edge distance -> node position
+        self._hashes: List[int] = []
+        self._indices: List[int] = []
+        self._children: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, hash_value: int, idx: int):
+        """Insert a 64-bit hash with its payload index"""
+        if not self._hashes:
+            self._hashes.append(hash_value)
+            self._indices.append(idx)
+            self._children.append({})
+            return
+
+        pos = 0
+        while True:
+            distance = (hash_value ^ self._hashes[pos]).bit_count()
+            child = self._children[pos].get(distance)
+            if child is None:
+                self._hashes.append(hash_value)
+                self._indices.append(idx)
+                self._children.append({})
+                self._children[pos][distance] = len(self._hashes) - 1
+                return
+            pos = child
+
+    def query(self, hash_value: int, radius: int) -> List[Tuple[int, int]]:
+        """Return (idx, distance) for all entries within radius of hash_value"""
+        if not self._hashes:
+            return []
+
+        results = []
+        stack = [0]
+        while stack:
+            pos = stack.pop()
+            distance = (hash_value ^ self._hashes[pos]).bit_count()
+            if distance <= radius:
+                results.append((self._indices[pos], distance))
+            for child_distance, child in self._children[pos].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
@@ -1,6 +1,7 @@
 """
 Configuration file for image deduplicator backend
 """
+import functools
 import os
 from pathlib import Path
 
@@ -24,6 +25,7 @@ MAX_SIMILARITY_THRESHOLD = 15
 # Scanning configuration
 MAX_FILE_SIZE_MB = 500  # Skip files larger than this
 BATCH_SIZE = 100  # Number of files to process before committing to DB
+SCAN_CONCURRENCY = 32  # Max files processed concurrently during a scan
 
 # Video processing
 VIDEO_FRAME_POSITION = 0.5  # Extract frame at 50% of video duration
@@ -41,13 +43,17 @@ LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 # Security
+@functools.lru_cache(maxsize=1024)
+def _resolved(path: str) -> Path:
+    """Cached Path.resolve(); deletes arrive in bursts against the same base"""
+    return Path(path).resolve()
+
+
 def is_path_safe(base_path: str, target_path: str) -> bool:
     """
     Verify that target_path is within base_path to prevent directory traversal
     """
     try:
-        base = Path(base_path).resolve()
-        target = Path(target_path).resolve()
-        return target.is_relative_to(base)
+        return _resolved(target_path).is_relative_to(_resolved(base_path))
     except (ValueError, OSError):
         return False
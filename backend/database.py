@@ -3,13 +3,28 @@ SQLite database layer for caching file information and hashes
 """
 import aiosqlite
 import logging
+import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Tuple
 from config import DB_PATH, DATA_DIR
 
 logger = logging.getLogger(__name__)
 
+# Hooks invoked whenever file rows change, so in-process memos built from
+# row data (e.g. the comparator's FileInfo cache) can be invalidated
+_write_hooks: List[Callable[[], None]] = []
+
+
+def register_write_hook(hook: Callable[[], None]):
+    """Register a callback to run after any write to the files table"""
+    _write_hooks.append(hook)
+
+
+def _notify_write_hooks():
+    for hook in _write_hooks:
+        hook()
+
 
 class Database:
     def __init__(self, db_path: Path = DB_PATH):
@@ -21,7 +36,22 @@ class Database:
         # Ensure data directory exists
         DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-        self.connection = await aiosqlite.connect(self.db_path)
+        # PARSE_DECLTYPES makes SQLite adapt TIMESTAMP columns to datetime
+        # objects at fetch time, so callers never re-parse ISO strings
+        self.connection = await aiosqlite.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+        )
+        # Name-indexable rows at C level — no per-row dict construction
+        self.connection.row_factory = aiosqlite.Row
+
+        # WAL + relaxed fsync: the cache can always be rebuilt by a
+        # re-scan, so durability is traded for write throughput
+        await self.connection.execute("PRAGMA journal_mode=WAL")
+        await self.connection.execute("PRAGMA synchronous=NORMAL")
+        await self.connection.execute("PRAGMA temp_store=MEMORY")
+        await self.connection.execute("PRAGMA mmap_size=268435456")
+
         await self.connection.execute("""
             CREATE TABLE IF NOT EXISTS files (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -32,8 +62,9 @@ class Database:
                 height INTEGER,
                 created_at TIMESTAMP NOT NULL,
                 modified_at TIMESTAMP NOT NULL,
+                modified_at_ns INTEGER,
                 file_type TEXT NOT NULL,
-                hash TEXT,
+                hash BLOB,
                 scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 UNIQUE(path)
             )
@@ -47,43 +78,85 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_path ON files(path)
         """)
 
+        # Partial covering indexes for the comparator's SoA fetch: both
+        # variants of get_hash_soa become index-only range scans already
+        # in hash order, skipping NULL-hash rows entirely
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_hash_covering
+            ON files(hash, size_bytes) WHERE hash IS NOT NULL
+        """)
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_type_hash
+            ON files(file_type, hash, size_bytes) WHERE hash IS NOT NULL
+        """)
+
         await self.connection.commit()
+
+        # Best-effort migration for databases created before the
+        # modified_at_ns column; NULL values just miss the cache once
+        try:
+            await self.connection.execute(
+                "ALTER TABLE files ADD COLUMN modified_at_ns INTEGER"
+            )
+            await self.connection.commit()
+        except sqlite3.OperationalError:
+            pass  # column already exists
+
+        await self._migrate_hex_hashes()
         logger.info(f"Database initialized at {self.db_path}")
 
+    async def _migrate_hex_hashes(self):
+        """Convert legacy hex TEXT hashes to packed 8-byte BLOBs"""
+        async with self.connection.execute(
+            "SELECT id, hash FROM files WHERE hash IS NOT NULL AND typeof(hash) = 'text'"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if rows:
+            await self.connection.executemany(
+                "UPDATE files SET hash = ? WHERE id = ?",
+                [(bytes.fromhex(hash_hex), file_id) for file_id, hash_hex in rows]
+            )
+            await self.connection.commit()
+            logger.info(f"Migrated {len(rows)} hex hashes to packed BLOBs")
+
     async def close(self):
         """Close database connection"""
         if self.connection:
             await self.connection.close()
             logger.info("Database connection closed")
 
-    async def get_file_by_path(self, path: str) -> Optional[Dict]:
+    async def get_file_by_path(self, path: str) -> Optional[aiosqlite.Row]:
         """Get cached file information by path"""
         async with self.connection.execute(
             "SELECT * FROM files WHERE path = ?", (path,)
         ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-            return None
+            return await cursor.fetchone()
 
-    async def insert_or_update_file(self, file_data: Dict) -> int:
-        """Insert or update file information"""
-        query = """
-            INSERT INTO files (
-                path, filename, size_bytes, width, height,
-                created_at, modified_at, file_type, hash
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(path) DO UPDATE SET
-                size_bytes = excluded.size_bytes,
-                width = excluded.width,
-                height = excluded.height,
-                modified_at = excluded.modified_at,
-                hash = excluded.hash,
-                scan_date = CURRENT_TIMESTAMP
-        """
+    @staticmethod
+    def _pack_hash(hash_value) -> Optional[bytes]:
+        """Normalize a hash to its packed 8-byte BLOB form (accepts hex strings)"""
+        if isinstance(hash_value, str):
+            return bytes.fromhex(hash_value)
+        return hash_value
+
+    _UPSERT_SQL = """
+        INSERT INTO files (
+            path, filename, size_bytes, width, height,
+            created_at, modified_at, modified_at_ns, file_type, hash
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            size_bytes = excluded.size_bytes,
+            width = excluded.width,
+            height = excluded.height,
+            modified_at = excluded.modified_at,
+            modified_at_ns = excluded.modified_at_ns,
+            hash = excluded.hash,
+            scan_date = CURRENT_TIMESTAMP
+    """
 
-        cursor = await self.connection.execute(query, (
+    def _upsert_params(self, file_data: Dict) -> tuple:
+        """Build the parameter tuple for the upsert statement"""
+        return (
             file_data['path'],
             file_data['filename'],
             file_data['size_bytes'],
@@ -91,20 +164,40 @@ class Database:
             file_data.get('height'),
             file_data['created_at'],
             file_data['modified_at'],
+            file_data.get('modified_at_ns'),
             file_data['file_type'],
-            file_data.get('hash')
-        ))
+            self._pack_hash(file_data.get('hash'))
+        )
+
+    async def insert_or_update_file(self, file_data: Dict) -> int:
+        """Insert or update file information"""
+        cursor = await self.connection.execute(
+            self._UPSERT_SQL, self._upsert_params(file_data)
+        )
         await self.connection.commit()
+        _notify_write_hooks()
         return cursor.lastrowid
 
-    async def get_all_files(self) -> List[Dict]:
+    async def insert_or_update_files_bulk(self, files: List[Dict]):
+        """Insert or update many files with one executemany and one commit
+
+        Committing per row makes SQLite fsync per file; batching the scan
+        writes is worth 50-100x on insert throughput.
+        """
+        if not files:
+            return
+        await self.connection.executemany(
+            self._UPSERT_SQL, [self._upsert_params(f) for f in files]
+        )
+        await self.connection.commit()
+        _notify_write_hooks()
+
+    async def get_all_files(self) -> List[aiosqlite.Row]:
         """Get all cached files"""
         async with self.connection.execute("SELECT * FROM files") as cursor:
-            rows = await cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+            return list(await cursor.fetchall())
 
-    async def get_files_with_hashes(self, file_type: str = 'both') -> List[Dict]:
+    async def get_files_with_hashes(self, file_type: str = 'both') -> List[aiosqlite.Row]:
         """Get all files that have computed hashes
 
         Args:
@@ -117,10 +210,75 @@ class Database:
             query = "SELECT * FROM files WHERE hash IS NOT NULL AND file_type = ? ORDER BY hash"
             params = (file_type,)
 
+        async with self.connection.execute(query, params) as cursor:
+            return list(await cursor.fetchall())
+
+    async def get_hash_soa(self, file_type: str = 'both') -> Tuple[List[int], List[int], bytes]:
+        """Get a structure-of-arrays view of all hashed files
+
+        Only the columns the comparator kernel needs: row ids, sizes and
+        the packed hashes concatenated into one buffer (8 bytes per file,
+        in hash order). Full rows are fetched later, only for survivors.
+
+        Args:
+            file_type: 'image', 'video', or 'both' to filter by type
+
+        Returns:
+            Tuple of (ids, sizes_bytes, packed_hashes)
+        """
+        if file_type == 'both':
+            query = """
+                SELECT id, size_bytes, hash FROM files
+                WHERE hash IS NOT NULL AND length(hash) = 8 ORDER BY hash
+            """
+            params = ()
+        else:
+            query = """
+                SELECT id, size_bytes, hash FROM files
+                WHERE hash IS NOT NULL AND length(hash) = 8 AND file_type = ?
+                ORDER BY hash
+            """
+            params = (file_type,)
+
         async with self.connection.execute(query, params) as cursor:
             rows = await cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+
+        ids = [row[0] for row in rows]
+        sizes = [row[1] for row in rows]
+        packed_hashes = b''.join(row[2] for row in rows)
+        return ids, sizes, packed_hashes
+
+    async def get_files_by_ids(self, ids: List[int]) -> Dict[int, aiosqlite.Row]:
+        """Get full file rows for the given ids, keyed by id"""
+        result = {}
+        # Chunk the IN clause to stay under SQLite's parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            async with self.connection.execute(
+                f"SELECT * FROM files WHERE id IN ({placeholders})", chunk
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    result[row['id']] = row
+        return result
+
+    async def get_files_by_paths(self, paths: List[str]) -> Dict[str, aiosqlite.Row]:
+        """Get full file rows for the given paths, keyed by path
+
+        Lets the scanner preload its cache in a handful of queries rather
+        than one lookup per file.
+        """
+        result = {}
+        # Chunk the IN clause to stay under SQLite's parameter limit
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            async with self.connection.execute(
+                f"SELECT * FROM files WHERE path IN ({placeholders})", chunk
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    result[row['path']] = row
+        return result
 
     async def delete_file_record(self, path: str) -> bool:
         """Delete file record from database"""
@@ -128,8 +286,25 @@ class Database:
             "DELETE FROM files WHERE path = ?", (path,)
         )
         await self.connection.commit()
+        _notify_write_hooks()
         return cursor.rowcount > 0
 
+    async def delete_file_records(self, paths: List[str]) -> int:
+        """Delete many file records with a single commit"""
+        if not paths:
+            return 0
+        deleted = 0
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = await self.connection.execute(
+                f"DELETE FROM files WHERE path IN ({placeholders})", chunk
+            )
+            deleted += cursor.rowcount
+        await self.connection.commit()
+        _notify_write_hooks()
+        return deleted
+
     async def get_stats(self) -> Dict:
         """Get database statistics"""
         async with self.connection.execute("""
@@ -162,6 +337,7 @@ class Database:
         """Clear all records from database (for testing/reset)"""
         await self.connection.execute("DELETE FROM files")
         await self.connection.commit()
+        _notify_write_hooks()
         logger.warning("All database records cleared")
 
 
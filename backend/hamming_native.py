@@ -0,0 +1,72 @@
+"""
+ctypes loader for the optional _hamming C extension
+
+The shared library is built manually next to this file:
+
+    cc -O3 -shared -fPIC -o _hamming.so _hamming.c
+
+When _hamming.so is missing the loader reports unavailable and the
+comparator falls back to its Numba/NumPy kernels.
+"""
+import ctypes
+import logging
+from pathlib import Path
+from typing import Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_LIB_PATH = Path(__file__).resolve().parent / '_hamming.so'
+_lib = None
+
+if _LIB_PATH.exists():
+    try:
+        _lib = ctypes.CDLL(str(_LIB_PATH))
+        _lib.hamming_pairs.restype = ctypes.c_int64
+        _lib.hamming_pairs.argtypes = [
+            ctypes.c_void_p,   # hashes
+            ctypes.c_int64,    # n
+            ctypes.c_int64,    # threshold
+            ctypes.c_void_p,   # out_i
+            ctypes.c_void_p,   # out_j
+            ctypes.c_void_p,   # out_d
+            ctypes.c_int64,    # capacity
+        ]
+        logger.info(f"Loaded native Hamming kernel from {_LIB_PATH}")
+    except OSError as e:
+        logger.warning(f"Could not load native Hamming kernel: {e}")
+        _lib = None
+
+
+def is_available() -> bool:
+    """Whether the native kernel was loaded"""
+    return _lib is not None
+
+
+def find_pairs(hashes: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs (i, j) with i < j whose Hamming distance is <= threshold
+
+    Args:
+        hashes: uint64 array of 64-bit perceptual hashes, shape (N,)
+        threshold: Maximum Hamming distance
+
+    Returns:
+        Tuple of (i_indices, j_indices, distances) arrays
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    cap = max(1024, 4 * n)
+
+    while True:
+        out_i = np.empty(cap, dtype=np.int32)
+        out_j = np.empty(cap, dtype=np.int32)
+        out_d = np.empty(cap, dtype=np.uint8)
+        count = _lib.hamming_pairs(
+            hashes.ctypes.data, n, threshold,
+            out_i.ctypes.data, out_j.ctypes.data, out_d.ctypes.data, cap
+        )
+        if count <= cap:
+            return out_i[:count], out_j[:count], out_d[:count]
+        # Buffer was too small; the kernel reports the true pair count
+        cap = count
@@ -7,12 +7,12 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, ORJSONResponse
 
 from config import API_HOST, API_PORT, CORS_ORIGINS, LOG_LEVEL, LOG_FORMAT, is_path_safe
 from models import (
     ScanRequest, ScanStatus, DuplicatesResponse, DeleteRequest,
-    DeleteResponse, StatsResponse
+    DeleteResponse, DeleteManyRequest, DeleteManyResponse, StatsResponse
 )
 from database import db
 from scanner import FileScanner, scan_status
@@ -39,7 +39,10 @@ app = FastAPI(
     title="Image Deduplicator API",
     description="API for detecting and removing duplicate/similar images and videos",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes the large duplicate-pair payloads several times
+    # faster than the stdlib json encoder
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -114,7 +117,7 @@ async def get_scan_status():
 
 
 @app.get("/api/duplicates")
-async def get_duplicates(threshold: int = 5, file_type: str = None):
+async def get_duplicates(threshold: int = 5, file_type: str = None, limit: int = None):
     """
     Get list of duplicate/similar file pairs
 
@@ -126,6 +129,7 @@ async def get_duplicates(threshold: int = 5, file_type: str = None):
                   15 = loosely similar
         file_type: Type of files to compare ('image', 'video', or 'both')
                   If not specified, uses the file_type from the last scan
+        limit: If specified, return only the top `limit` most similar pairs
     """
     if threshold < 0 or threshold > 15:
         raise HTTPException(
@@ -133,6 +137,12 @@ async def get_duplicates(threshold: int = 5, file_type: str = None):
             detail="Threshold must be between 0 and 15"
         )
 
+    if limit is not None and limit < 1:
+        raise HTTPException(
+            status_code=400,
+            detail="limit must be a positive integer"
+        )
+
     # Use file_type from last scan if not specified
     if file_type is None:
         file_type = scan_status.file_type
@@ -145,11 +155,11 @@ async def get_duplicates(threshold: int = 5, file_type: str = None):
         )
 
     try:
-        pairs = await ImageComparator.find_duplicates(
+        pairs, total_savings = await ImageComparator.find_duplicates(
             similarity_threshold=threshold,
-            file_type=file_type
+            file_type=file_type,
+            limit=limit
         )
-        total_savings = ImageComparator.calculate_potential_savings(pairs)
 
         return DuplicatesResponse(
             pairs=pairs,
@@ -206,6 +216,46 @@ async def delete_file(request: DeleteRequest):
         raise HTTPException(status_code=500, detail=f"Error deleting file: {str(e)}")
 
 
+@app.post("/api/delete_many", response_model=DeleteManyResponse)
+async def delete_files(request: DeleteManyRequest):
+    """
+    Delete multiple files in one call
+
+    Security: resolves the base path once and validates every target
+    against it; DB records are removed with a single bulk delete
+    """
+    try:
+        base_path = Path(request.scan_base_path).resolve()
+    except OSError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid base path: {e}")
+
+    deleted = []
+    errors = []
+    for raw_path in request.file_paths:
+        try:
+            file_path = Path(raw_path).resolve()
+            if not file_path.is_relative_to(base_path):
+                errors.append(f"{raw_path}: outside of scanned directory")
+                continue
+            if not file_path.is_file():
+                errors.append(f"{raw_path}: not a file")
+                continue
+            file_path.unlink()
+            deleted.append(str(file_path))
+        except OSError as e:
+            errors.append(f"{raw_path}: {e}")
+
+    if deleted:
+        await db.delete_file_records(deleted)
+        logger.info(f"Bulk delete removed {len(deleted)} files")
+
+    return DeleteManyResponse(
+        success=len(errors) == 0,
+        deleted=deleted,
+        errors=errors
+    )
+
+
 @app.get("/api/stats", response_model=StatsResponse)
 async def get_stats():
     """Get general statistics about cached files"""
@@ -100,6 +100,19 @@ class DeleteRequest(BaseModel):
         return str(p.resolve())
 
 
+class DeleteManyRequest(BaseModel):
+    """Request to delete multiple files in one call"""
+    file_paths: List[str]
+    scan_base_path: str  # For security validation
+
+
+class DeleteManyResponse(BaseModel):
+    """Response after a bulk delete"""
+    success: bool
+    deleted: List[str]
+    errors: List[str]
+
+
 class DeleteResponse(BaseModel):
     """Response after deleting a file"""
     success: bool